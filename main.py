@@ -2,8 +2,13 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
 import csv
+import bisect
+from snapshot import write_snapshot, SnapshotReader
 from PIL import Image, ImageTk  # For handling the logo image
 
+# Number of most recent change feed rows kept when the log is pruned
+CHANGE_LOG_RETENTION = 10000
+
 class InventoryApp:
     def __init__(self, root):
         self.root = root
@@ -17,8 +22,24 @@ class InventoryApp:
         # Database connection
         self.db = DatabaseManager()
         
+        # Sequence number of the last change applied to the view
+        self.last_change_seq = 0
+        self.last_data_version = None
+        
+        # Search term the view is currently filtered by
+        self.active_search = ""
+        
         # Load the inventory data
         self.load_inventory()
+        
+        # Watch the database for edits made by other instances
+        self.watch_changes()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def on_close(self):
+        self.db.close()
+        self.root.destroy()
     
     def setup_frames(self):
         # Create header 
@@ -173,6 +194,18 @@ class InventoryApp:
             command=self.import_csv
         ).pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(
+            button_frame,
+            text="Export Snapshot",
+            command=self.export_snapshot
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(
+            button_frame,
+            text="Import Snapshot",
+            command=self.import_snapshot
+        ).pack(side=tk.LEFT, padx=5)
+        
         ttk.Separator(button_frame, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=10, fill=tk.Y)
         
         ttk.Button(
@@ -186,19 +219,96 @@ class InventoryApp:
         for item in self.inventory_tree.get_children():
             self.inventory_tree.delete(item)
         
+        self.active_search = ""
+        
+        # Note the change sequence before reading, so anything committed
+        # during the load is picked up again by the change feed
+        self.last_change_seq = self.db.get_latest_change_seq()
+        
         # Get inventory from database
         items = self.db.get_all_items()
         
         # Insert items into treeview
+        self.show_items(items)
+        
+        self.status_bar.config(text=f"Loaded {len(items)} items")
+    
+    def refresh_view(self):
+        """Reload the view, keeping the active search if there is one"""
+        if self.active_search:
+            self.show_search_results(self.active_search)
+        else:
+            self.load_inventory()
+    
+    def show_items(self, items):
+        """Insert items, already ordered by name and id, into the empty treeview"""
+        # Sort keys of the displayed rows, kept in treeview order so live
+        # changes can be placed by bisection
+        self.sorted_rows = [(item[1], item[0]) for item in items]
+        self.row_keys = {str(item[0]): (item[1], item[0]) for item in items}
+        
         for item in items:
-            total_value = float(item[3]) * float(item[4])
             self.inventory_tree.insert(
                 "",
                 tk.END,
-                values=(item[0], item[1], item[2], item[3], f"£{item[4]:.2f}", f"£{total_value:.2f}")
+                iid=str(item[0]),
+                values=self.format_item_values(item)
             )
+    
+    def format_item_values(self, item):
+        total_value = float(item[3]) * float(item[4])
+        return (item[0], item[1], item[2], item[3], f"£{item[4]:.2f}", f"£{total_value:.2f}")
+    
+    def watch_changes(self, interval_ms=1000):
+        """Poll the database cheaply and apply only rows changed elsewhere"""
+        data_version = self.db.get_data_version()
+        if data_version is not None and data_version != self.last_data_version:
+            self.last_data_version = data_version
+            self.apply_changes()
         
-        self.status_bar.config(text=f"Loaded {len(items)} items")
+        self.root.after(interval_ms, self.watch_changes, interval_ms)
+    
+    def apply_changes(self):
+        """Update the treeview with rows changed since the last applied sequence"""
+        latest_seq, changes = self.db.get_changes_since(self.last_change_seq, self.active_search)
+        if changes is None:
+            # Too far behind the pruned change feed to catch up row by row
+            self.refresh_view()
+            return
+        self.last_change_seq = latest_seq
+        
+        for item_id, item in changes:
+            iid = str(item_id)
+            key = self.row_keys.pop(iid, None)
+            if key is not None:
+                del self.sorted_rows[bisect.bisect_left(self.sorted_rows, key)]
+            
+            if item is None:
+                if self.inventory_tree.exists(iid):
+                    self.inventory_tree.delete(iid)
+                continue
+            
+            # Position among the other rows, ordered like the SQL queries
+            key = (item[1], item[0])
+            index = bisect.bisect_left(self.sorted_rows, key)
+            self.sorted_rows.insert(index, key)
+            self.row_keys[iid] = key
+            
+            if not self.inventory_tree.exists(iid):
+                self.inventory_tree.insert("", index, iid=iid, values=self.format_item_values(item))
+                continue
+            
+            self.inventory_tree.item(iid, values=self.format_item_values(item))
+            if self.inventory_tree.index(iid) != index:
+                # Detach first so index counts only the other rows
+                selected = iid in self.inventory_tree.selection()
+                self.inventory_tree.detach(iid)
+                self.inventory_tree.move(iid, "", index)
+                if selected:
+                    self.inventory_tree.selection_add(iid)
+        
+        if changes:
+            self.status_bar.config(text=f"Applied {len(changes)} changes")
     
     def search_inventory(self):
         search_term = self.search_var.get().strip().lower()
@@ -206,21 +316,22 @@ class InventoryApp:
             self.load_inventory()
             return
         
+        self.show_search_results(search_term)
+    
+    def show_search_results(self, search_term):
+        self.active_search = search_term
+        
         # Clear existing items
         for item in self.inventory_tree.get_children():
             self.inventory_tree.delete(item)
         
+        self.last_change_seq = self.db.get_latest_change_seq()
+        
         # Get search results
         items = self.db.search_items(search_term)
         
         # Insert items into treeview
-        for item in items:
-            total_value = float(item[3]) * float(item[4])
-            self.inventory_tree.insert(
-                "",
-                tk.END,
-                values=(item[0], item[1], item[2], item[3], f"£{item[4]:.2f}", f"£{total_value:.2f}")
-            )
+        self.show_items(items)
         
         self.status_bar.config(text=f"Found {len(items)} items")
     
@@ -334,6 +445,38 @@ class InventoryApp:
                     messagebox.showerror("Error", "Failed to import data")
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {str(e)}")
+    
+    def export_snapshot(self):
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".baeinv",
+            filetypes=[("Inventory snapshots", "*.baeinv"), ("All files", "*.*")]
+        )
+        
+        if filename:
+            try:
+                success = self.db.export_to_snapshot(filename)
+                if success:
+                    messagebox.showinfo("Success", f"Data exported to {filename}")
+                else:
+                    messagebox.showerror("Error", "Failed to export data")
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+    
+    def import_snapshot(self):
+        filename = filedialog.askopenfilename(
+            filetypes=[("Inventory snapshots", "*.baeinv"), ("All files", "*.*")]
+        )
+        
+        if filename:
+            try:
+                success = self.db.import_from_snapshot(filename)
+                if success:
+                    messagebox.showinfo("Success", f"Data imported from {filename}")
+                    self.load_inventory()
+                else:
+                    messagebox.showerror("Error", "Failed to import data")
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
 
 class ItemDialog:
@@ -410,7 +553,10 @@ class DatabaseManager:
     def __init__(self, db_file="inventory.db"):
         """Initialize database connection and create tables"""
         self.db_file = db_file
+        self.watch_conn = None
+        self.change_log_retention = CHANGE_LOG_RETENTION
         self.create_tables()
+        self.prune_changes()
     
     def create_tables(self):
         """Create necessary tables if they don't exist"""
@@ -430,6 +576,18 @@ class DatabaseManager:
                 )
             ''')
             
+            # Change feed - one row per insert/update/delete on inventory, or a
+            # single 'reload' row with no item_id for a bulk load
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS inventory_changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    item_id INTEGER,
+                    operation TEXT NOT NULL
+                )
+            ''')
+            
+            self.create_change_triggers(cursor)
+            
             conn.commit()
         except sqlite3.Error as e:
             print(f"Database error: {e}")
@@ -437,6 +595,53 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    def create_change_triggers(self, cursor):
+        """Create the triggers that record inventory edits in the change feed"""
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS inventory_after_insert
+            AFTER INSERT ON inventory
+            BEGIN
+                INSERT INTO inventory_changes (item_id, operation) VALUES (NEW.id, 'insert');
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS inventory_after_update
+            AFTER UPDATE ON inventory
+            BEGIN
+                INSERT INTO inventory_changes (item_id, operation) VALUES (NEW.id, 'update');
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS inventory_after_delete
+            AFTER DELETE ON inventory
+            BEGIN
+                INSERT INTO inventory_changes (item_id, operation) VALUES (OLD.id, 'delete');
+            END
+        ''')
+    
+    def bulk_insert_items(self, cursor, rows):
+        """Insert many (name, category, quantity, price) rows in the cursor's transaction.
+        
+        Instead of one change feed row per item, a single 'reload' change is
+        recorded and older changes are dropped, since every client behind it
+        has to reload anyway.
+        """
+        # Recording the reload first also opens the transaction, so the
+        # trigger changes below are rolled back along with a failed load
+        cursor.execute("INSERT INTO inventory_changes (item_id, operation) VALUES (NULL, 'reload')")
+        reload_seq = cursor.lastrowid
+        
+        cursor.execute("DROP TRIGGER IF EXISTS inventory_after_insert")
+        cursor.executemany(
+            "INSERT INTO inventory (name, category, quantity, price) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        self.create_change_triggers(cursor)
+        
+        cursor.execute("DELETE FROM inventory_changes WHERE seq < ?", (reload_seq,))
+    
     def add_item(self, name, category, quantity, price):
         """Add a new item to the inventory"""
         conn = None
@@ -448,9 +653,11 @@ class DatabaseManager:
                 "INSERT INTO inventory (name, category, quantity, price) VALUES (?, ?, ?, ?)",
                 (name, category, quantity, price)
             )
+            item_id = cursor.lastrowid
+            self.delete_old_changes(cursor)
             
             conn.commit()
-            return cursor.lastrowid
+            return item_id
         except sqlite3.Error as e:
             print(f"Database error: {e}")
             return None
@@ -465,7 +672,7 @@ class DatabaseManager:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
             
-            cursor.execute("SELECT * FROM inventory ORDER BY name")
+            cursor.execute("SELECT * FROM inventory ORDER BY name, id")
             return cursor.fetchall()
         except sqlite3.Error as e:
             print(f"Database error: {e}")
@@ -501,9 +708,11 @@ class DatabaseManager:
                 "UPDATE inventory SET name = ?, category = ?, quantity = ?, price = ? WHERE id = ?",
                 (name, category, quantity, price, item_id)
             )
+            updated = cursor.rowcount > 0
+            self.delete_old_changes(cursor)
             
             conn.commit()
-            return cursor.rowcount > 0
+            return updated
         except sqlite3.Error as e:
             print(f"Database error: {e}")
             return False
@@ -519,9 +728,11 @@ class DatabaseManager:
             cursor = conn.cursor()
             
             cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+            deleted = cursor.rowcount > 0
+            self.delete_old_changes(cursor)
             
             conn.commit()
-            return cursor.rowcount > 0
+            return deleted
         except sqlite3.Error as e:
             print(f"Database error: {e}")
             return False
@@ -529,6 +740,12 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    @staticmethod
+    def search_pattern(search_term):
+        """Build a LIKE pattern matching search_term literally anywhere in a value"""
+        escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"%{escaped}%"
+    
     def search_items(self, search_term):
         """Search for items by name or category"""
         conn = None
@@ -536,9 +753,9 @@ class DatabaseManager:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
             
-            search_pattern = f"%{search_term}%"
+            search_pattern = self.search_pattern(search_term)
             cursor.execute(
-                "SELECT * FROM inventory WHERE name LIKE ? OR category LIKE ? ORDER BY name",
+                "SELECT * FROM inventory WHERE name LIKE ? ESCAPE '\\' OR category LIKE ? ESCAPE '\\' ORDER BY name, id",
                 (search_pattern, search_pattern)
             )
             
@@ -550,6 +767,151 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    def get_latest_change_seq(self):
+        """Return the sequence number of the most recent change"""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM inventory_changes")
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+        finally:
+            if conn:
+                conn.close()
+    
+    def delete_old_changes(self, cursor, keep=None):
+        """Delete all but the most recent `keep` change feed rows in the cursor's transaction.
+        
+        Called on every write so the log never grows past the retention
+        limit, however long instances stay open.
+        """
+        if keep is None:
+            keep = self.change_log_retention
+        
+        # At least the newest row is always kept, so clients can still
+        # tell whether they have fallen behind the pruned part of the log
+        cursor.execute(
+            "DELETE FROM inventory_changes WHERE seq <= (SELECT MAX(seq) FROM inventory_changes) - ?",
+            (max(keep, 1),)
+        )
+        return cursor.rowcount
+    
+    def prune_changes(self, keep=None):
+        """Delete all but the most recent `keep` change feed rows"""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            
+            deleted = self.delete_old_changes(cursor, keep)
+            
+            conn.commit()
+            return deleted
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_changes_since(self, seq, search_term=""):
+        """Return the latest sequence and the current row of each item changed after seq.
+        
+        Rows are None for items that have been deleted, or that no longer
+        match search_term when one is given. The change list is None when
+        changes after seq have been pruned or a bulk load happened since,
+        and the caller has to reload everything.
+        """
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            
+            # One statement, so the pruning and reload checks and the changes
+            # all come from the same snapshot of the database
+            cursor.execute(
+                """
+                WITH bounds AS (
+                    SELECT MIN(seq) AS oldest_seq, MAX(seq) AS newest_seq,
+                           EXISTS (
+                               SELECT 1 FROM inventory_changes
+                               WHERE seq > :seq AND operation = 'reload'
+                           ) AS reloaded
+                    FROM inventory_changes
+                ), changed AS (
+                    SELECT item_id, MAX(seq) AS last_seq
+                    FROM inventory_changes
+                    WHERE seq > :seq
+                    GROUP BY item_id
+                )
+                SELECT b.oldest_seq, b.newest_seq, b.reloaded,
+                       c.last_seq, c.item_id, i.id, i.name, i.category, i.quantity, i.price,
+                       :search_term = ''
+                       OR i.name LIKE :search_pattern ESCAPE '\\'
+                       OR i.category LIKE :search_pattern ESCAPE '\\'
+                FROM bounds AS b
+                LEFT JOIN changed AS c ON 1
+                LEFT JOIN inventory AS i ON i.id = c.item_id
+                ORDER BY c.last_seq
+                """,
+                {"seq": seq, "search_term": search_term, "search_pattern": self.search_pattern(search_term)}
+            )
+            rows = cursor.fetchall()
+            
+            oldest_seq, newest_seq, reloaded = rows[0][:3]
+            if reloaded or (oldest_seq is not None and seq < oldest_seq - 1):
+                return newest_seq, None
+            
+            latest_seq = seq
+            changes = []
+            for row in rows:
+                if row[3] is None:
+                    # No changes after seq
+                    continue
+                if row[4] is None:
+                    # Only bulk loads log a change without an item
+                    return newest_seq, None
+                latest_seq = max(latest_seq, row[3])
+                item = row[5:10] if row[5] is not None and row[10] else None
+                changes.append((row[4], item))
+            
+            return latest_seq, changes
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return seq, []
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_data_version(self):
+        """Return PRAGMA data_version, which changes when another connection commits.
+        
+        The value is only meaningful on a connection that stays open, so a
+        dedicated watch connection is kept for it.
+        """
+        try:
+            if self.watch_conn is None:
+                self.watch_conn = sqlite3.connect(self.db_file)
+            return self.watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            # Reconnect on the next call rather than reuse a broken connection
+            self.close()
+            return None
+    
+    def close(self):
+        """Close the watch connection if one is open"""
+        if self.watch_conn:
+            try:
+                self.watch_conn.close()
+            except sqlite3.Error as e:
+                print(f"Database error: {e}")
+            self.watch_conn = None
+    
     def export_to_csv(self, filename):
         """Export inventory data to a CSV file"""
         conn = None
@@ -587,17 +949,61 @@ class DatabaseManager:
                 conn = sqlite3.connect(self.db_file)
                 cursor = conn.cursor()
                 
-                for row in reader:
-                    if len(row) >= 4:  
-                        name = row[1]
-                        category = row[2]
-                        quantity = int(row[3])
-                        price = float(row[4])
-                        
-                        cursor.execute(
-                            "INSERT INTO inventory (name, category, quantity, price) VALUES (?, ?, ?, ?)",
-                            (name, category, quantity, price)
-                        )
+                self.bulk_insert_items(
+                    cursor,
+                    (
+                        (row[1], row[2], int(row[3]), float(row[4]))
+                        for row in reader
+                        if len(row) >= 4
+                    )
+                )
+                
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Import error: {e}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
+    def export_to_snapshot(self, filename):
+        """Export inventory data to a binary columnar snapshot file"""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            
+            # Rows are streamed from the cursor a block at a time
+            cursor.execute("SELECT id, name, category, quantity, price FROM inventory ORDER BY name")
+            write_snapshot(filename, cursor)
+            
+            return True
+        except Exception as e:
+            print(f"Export error: {e}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+    
+    def import_from_snapshot(self, filename):
+        """Import inventory data from a binary columnar snapshot file"""
+        conn = None
+        try:
+            with SnapshotReader(filename) as reader:
+                conn = sqlite3.connect(self.db_file)
+                cursor = conn.cursor()
+                
+                self.bulk_insert_items(
+                    cursor,
+                    (
+                        row
+                        for block in reader
+                        for row in zip(block.names(), block.categories(), block.quantities, block.prices)
+                    )
+                )
                 
                 conn.commit()
                 return True
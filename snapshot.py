@@ -0,0 +1,278 @@
+"""Binary columnar snapshot format for bulk inventory export and import.
+
+A snapshot file is a fixed header followed by blocks of at most 65536
+rows. Each block stores its rows column by column:
+
+    id        per-block base + uint8/16/32/64 offsets[n]
+    quantity  int8/16/32/64[n]
+    price     float64[n]
+    name      uint32 offsets[n + 1] + UTF-8 bytes
+    category  uint16 codes[n] into a per-block string table of k entries,
+              stored as uint32 offsets[k + 1] + UTF-8 bytes; a NULL
+              category gets its own table slot, named in the block header
+
+The id and quantity columns use the narrowest type that fits the block,
+recorded in the block header. Every section is padded to 8 bytes and all
+numbers are little-endian, so on little-endian machines the columns can
+be read straight out of a memory-mapped file without copying.
+"""
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"BAEINV\x00\x02"
+HEADER = struct.Struct("<8sQ")  # magic, total row count
+# rows, categories, NULL category code, id typecode, quantity typecode, id base
+BLOCK_HEADER = struct.Struct("<IIIcc2xq")
+NO_NULL_CODE = 0xFFFFFFFF
+# Category codes are uint16, so a block can't hold more distinct values
+BLOCK_ROWS = 65536
+
+ID_TYPECODES = "BHIQ"
+QUANTITY_TYPECODES = "bhiq"
+
+_NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _pad(length):
+    return -length % 8
+
+
+def _write_array(file, values):
+    if not _NATIVE_LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    data = values.tobytes()
+    file.write(data)
+    file.write(b"\x00" * _pad(len(data)))
+
+
+def _narrowest(values, typecodes):
+    low, high = min(values), max(values)
+    for typecode in typecodes:
+        try:
+            array(typecode, (low, high))
+            return typecode
+        except OverflowError:
+            pass
+    raise OverflowError(f"Values from {low} to {high} do not fit a snapshot column")
+
+
+def _write_strings(file, strings):
+    offsets = array("I", [0])
+    encoded = []
+    position = 0
+    for value in strings:
+        data = value.encode("utf-8")
+        encoded.append(data)
+        position += len(data)
+        offsets.append(position)
+    _write_array(file, offsets)
+    data = b"".join(encoded)
+    file.write(data)
+    file.write(b"\x00" * _pad(len(data)))
+
+
+def write_snapshot(filename, rows, block_rows=BLOCK_ROWS):
+    """Stream (id, name, category, quantity, price) rows into a snapshot file.
+
+    rows may be any iterable, e.g. a database cursor; only one block of
+    rows is held in memory at a time. Returns the number of rows written.
+    """
+    if not 0 < block_rows <= BLOCK_ROWS:
+        raise ValueError(f"block_rows must be between 1 and {BLOCK_ROWS}")
+
+    total = 0
+    with open(filename, "wb") as file:
+        file.write(HEADER.pack(MAGIC, 0))
+
+        rows = iter(rows)
+        while True:
+            block = []
+            for row in rows:
+                block.append(row)
+                if len(block) == block_rows:
+                    break
+            if not block:
+                break
+
+            categories = {}
+            codes = array("H")
+            for row in block:
+                codes.append(categories.setdefault(row[2], len(categories)))
+            null_code = categories.get(None, NO_NULL_CODE)
+
+            ids = [row[0] for row in block]
+            id_base = min(ids)
+            id_offsets = [item_id - id_base for item_id in ids]
+            id_typecode = _narrowest(id_offsets, ID_TYPECODES)
+            quantities = [row[3] for row in block]
+            quantity_typecode = _narrowest(quantities, QUANTITY_TYPECODES)
+
+            file.write(BLOCK_HEADER.pack(
+                len(block), len(categories), null_code,
+                id_typecode.encode("ascii"), quantity_typecode.encode("ascii"), id_base
+            ))
+            _write_array(file, array(id_typecode, id_offsets))
+            _write_array(file, array(quantity_typecode, quantities))
+            _write_array(file, array("d", (row[4] for row in block)))
+            _write_strings(file, (row[1] for row in block))
+            _write_array(file, codes)
+            _write_strings(file, (category or "" for category in categories))
+
+            total += len(block)
+
+        # Go back and record the final row count in the header
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, total))
+
+    return total
+
+
+def _decode_strings(offsets, data):
+    text = str(data, "utf-8")
+    if len(text) == len(data):
+        # Pure ASCII: byte offsets are also character offsets
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    return [str(data[offsets[i]:offsets[i + 1]], "utf-8") for i in range(len(offsets) - 1)]
+
+
+class SnapshotBlock:
+    """Column views over one block of a memory-mapped snapshot"""
+
+    def __init__(self, id_base, id_offsets, quantities, prices, name_offsets, name_data,
+                 category_codes, category_offsets, category_data, null_code=NO_NULL_CODE):
+        self.id_base = id_base
+        self.id_offsets = id_offsets
+        self.quantities = quantities
+        self.prices = prices
+        self.name_offsets = name_offsets
+        self.name_data = name_data
+        self.category_codes = category_codes
+        self.category_offsets = category_offsets
+        self.category_data = category_data
+        self.null_code = null_code
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def ids(self):
+        """Decode the id column"""
+        id_base = self.id_base
+        return [id_base + offset for offset in self.id_offsets]
+
+    def names(self):
+        """Decode the name column"""
+        return _decode_strings(self.name_offsets, self.name_data)
+
+    def categories(self):
+        """Decode the category column through the block's string table"""
+        table = _decode_strings(self.category_offsets, self.category_data)
+        if self.null_code != NO_NULL_CODE:
+            table[self.null_code] = None
+        return [table[code] for code in self.category_codes]
+
+    def rows(self):
+        """Return the block as (id, name, category, quantity, price) tuples"""
+        return zip(self.ids(), self.names(), self.categories(), self.quantities, self.prices)
+
+
+class SnapshotReader:
+    """Read a snapshot file through a memory map.
+
+    Numeric columns are exposed as memoryviews onto the map, so they are
+    not copied until they are used. Use as a context manager and do not
+    keep column views after it exits.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.map = None
+        self.views = []
+        self.row_count = 0
+
+    def __enter__(self):
+        self.file = open(self.filename, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.map) < HEADER.size:
+                raise ValueError("Not an inventory snapshot file")
+            magic, self.row_count = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError("Not an inventory snapshot file")
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        # Views onto the map must be released before the map can close
+        for view in self.views:
+            view.release()
+        self.views = []
+        if self.map:
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _column(self, position, typecode, count):
+        size = array(typecode).itemsize * count
+        end = position + size
+        if end > len(self.map):
+            raise ValueError("Truncated inventory snapshot file")
+
+        raw = memoryview(self.map)[position:end]
+        self.views.append(raw)
+        if _NATIVE_LITTLE_ENDIAN:
+            column = raw.cast(typecode)
+            self.views.append(column)
+        else:
+            column = array(typecode, raw.tobytes())
+            column.byteswap()
+        return column, end + _pad(size)
+
+    def _bytes(self, position, length):
+        end = position + length
+        if end > len(self.map):
+            raise ValueError("Truncated inventory snapshot file")
+
+        data = memoryview(self.map)[position:end]
+        self.views.append(data)
+        return data, end + _pad(length)
+
+    def __iter__(self):
+        """Yield a SnapshotBlock for each block in the file"""
+        position = HEADER.size
+        while position < len(self.map):
+            if position + BLOCK_HEADER.size > len(self.map):
+                raise ValueError("Truncated inventory snapshot file")
+            (count, category_count, null_code,
+             id_typecode, quantity_typecode, id_base) = BLOCK_HEADER.unpack_from(self.map, position)
+            position += BLOCK_HEADER.size
+
+            id_typecode = id_typecode.decode("ascii")
+            quantity_typecode = quantity_typecode.decode("ascii")
+            if (id_typecode not in ID_TYPECODES or quantity_typecode not in QUANTITY_TYPECODES
+                    or (null_code != NO_NULL_CODE and null_code >= category_count)):
+                raise ValueError("Corrupt inventory snapshot file")
+
+            id_offsets, position = self._column(position, id_typecode, count)
+            quantities, position = self._column(position, quantity_typecode, count)
+            prices, position = self._column(position, "d", count)
+            name_offsets, position = self._column(position, "I", count + 1)
+            name_data, position = self._bytes(position, name_offsets[count])
+            category_codes, position = self._column(position, "H", count)
+            category_offsets, position = self._column(position, "I", category_count + 1)
+            category_data, position = self._bytes(position, category_offsets[category_count])
+
+            yield SnapshotBlock(
+                id_base, id_offsets, quantities, prices, name_offsets, name_data,
+                category_codes, category_offsets, category_data, null_code
+            )
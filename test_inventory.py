@@ -2,9 +2,11 @@ import unittest
 import os
 import sqlite3
 from tempfile import NamedTemporaryFile
+from unittest import mock
 
 # Import your database manager class
 from main import DatabaseManager
+from snapshot import write_snapshot, SnapshotReader
 
 class TestDatabaseManager(unittest.TestCase):
     def setUp(self):
@@ -13,8 +15,25 @@ class TestDatabaseManager(unittest.TestCase):
         self.temp_db.close()
         self.db_manager = DatabaseManager(self.temp_db.name)
     
+    def run_before_change_query(self, action):
+        """Patch sqlite3.connect so action runs just before the change feed query starts"""
+        real_connect = sqlite3.connect
+        pending = [action]
+        
+        def trace(statement):
+            if "GROUP BY" in statement and pending:
+                pending.pop()()
+        
+        def connect(*args, **kwargs):
+            conn = real_connect(*args, **kwargs)
+            conn.set_trace_callback(trace)
+            return conn
+        
+        return mock.patch("sqlite3.connect", connect)
+    
     def tearDown(self):
-        # Delete the temporary database file
+        # Close the watch connection and delete the temporary database file
+        self.db_manager.close()
         os.unlink(self.temp_db.name)
     
     def test_add_item(self):
@@ -74,6 +93,277 @@ class TestDatabaseManager(unittest.TestCase):
         results = self.db_manager.search_items("laptop")
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0][1], "Laptop")
+    
+    def test_search_items_treats_wildcards_literally(self):
+        self.db_manager.add_item("50% Off Sticker", "Office Supplies", 20, 0.1)
+        self.db_manager.add_item("Packing Tape", "Office_Supplies", 8, 2.5)
+        self.db_manager.add_item("Stapler", "Office Supplies", 4, 6.0)
+        
+        results = self.db_manager.search_items("50%")
+        self.assertEqual([item[1] for item in results], ["50% Off Sticker"])
+        
+        results = self.db_manager.search_items("office_")
+        self.assertEqual([item[1] for item in results], ["Packing Tape"])
+    
+    def test_changes_since_with_search(self):
+        item_id = self.db_manager.add_item("Laptop", "Electronics", 5, 899.99)
+        other_id = self.db_manager.add_item("Pencil", None, 100, 0.99)
+        start_seq = self.db_manager.get_latest_change_seq()
+        
+        self.db_manager.update_item(item_id, "Laptop", "Electronics", 6, 899.99)
+        self.db_manager.update_item(other_id, "Pencil", None, 90, 0.99)
+        
+        # Rows that do not match the active search come back as None
+        latest_seq, changes = self.db_manager.get_changes_since(start_seq, "electron")
+        changed = dict(changes)
+        self.assertEqual(changed[item_id][3], 6)
+        self.assertIsNone(changed[other_id])
+        
+        # Without a search every changed row is returned
+        latest_seq, changes = self.db_manager.get_changes_since(start_seq)
+        self.assertEqual(dict(changes)[other_id][3], 90)
+    
+    def test_changes_since(self):
+        # Record where the feed starts
+        start_seq = self.db_manager.get_latest_change_seq()
+        
+        kept_id = self.db_manager.add_item("Radar", "Electronics", 2, 1500.0)
+        deleted_id = self.db_manager.add_item("Spanner", "Tools", 10, 7.5)
+        self.db_manager.update_item(kept_id, "Radar", "Electronics", 4, 1500.0)
+        self.db_manager.delete_item(deleted_id)
+        
+        latest_seq, changes = self.db_manager.get_changes_since(start_seq)
+        self.assertEqual(latest_seq, self.db_manager.get_latest_change_seq())
+        
+        # Each item appears once with its current row, or None if deleted
+        changed = dict(changes)
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changed[kept_id][3], 4)
+        self.assertIsNone(changed[deleted_id])
+        
+        # Nothing new after the latest sequence
+        self.assertEqual(self.db_manager.get_changes_since(latest_seq), (latest_seq, []))
+    
+    def test_prune_changes(self):
+        start_seq = self.db_manager.get_latest_change_seq()
+        for i in range(5):
+            self.db_manager.add_item(f"Item {i}", "Test Category", i, 1.0)
+        latest_seq = self.db_manager.get_latest_change_seq()
+        
+        self.assertEqual(self.db_manager.prune_changes(keep=2), 3)
+        self.assertEqual(self.db_manager.get_latest_change_seq(), latest_seq)
+        
+        # Clients still inside the kept window catch up incrementally
+        seq, changes = self.db_manager.get_changes_since(latest_seq - 2)
+        self.assertEqual((seq, len(changes)), (latest_seq, 2))
+        
+        # Clients behind the pruned rows are told to reload
+        seq, changes = self.db_manager.get_changes_since(start_seq)
+        self.assertEqual(seq, latest_seq)
+        self.assertIsNone(changes)
+        
+        # The newest row is always kept
+        self.db_manager.prune_changes(keep=0)
+        self.assertEqual(self.db_manager.get_latest_change_seq(), latest_seq)
+        self.assertEqual(self.db_manager.get_changes_since(latest_seq), (latest_seq, []))
+    
+    def test_bulk_import_records_single_reload(self):
+        self.db_manager.add_item("Laptop", "Electronics", 5, 899.99)
+        start_seq = self.db_manager.get_latest_change_seq()
+        
+        csv_file = NamedTemporaryFile("w", delete=False, suffix=".csv", newline="")
+        csv_file.write("ID,Name,Category,Quantity,Price\n")
+        for i in range(50):
+            csv_file.write(f"{i},Bolt {i},Fixings,{i},0.25\n")
+        csv_file.close()
+        try:
+            self.assertTrue(self.db_manager.import_from_csv(csv_file.name))
+        finally:
+            os.unlink(csv_file.name)
+        
+        # One reload row replaces the per-item changes and everything before it
+        conn = sqlite3.connect(self.temp_db.name)
+        rows = conn.execute("SELECT item_id, operation FROM inventory_changes").fetchall()
+        conn.close()
+        self.assertEqual(rows, [(None, "reload")])
+        
+        reload_seq = self.db_manager.get_latest_change_seq()
+        self.assertEqual(self.db_manager.get_changes_since(start_seq), (reload_seq, None))
+        
+        # Triggers are back in place for ordinary edits
+        item_id = self.db_manager.add_item("Drill", "Tools", 1, 49.0)
+        latest_seq, changes = self.db_manager.get_changes_since(reload_seq)
+        self.assertEqual([change[0] for change in changes], [item_id])
+    
+    def test_changes_since_sees_import_from_other_instance(self):
+        start_seq = self.db_manager.get_latest_change_seq()
+        
+        csv_file = NamedTemporaryFile("w", delete=False, suffix=".csv", newline="")
+        csv_file.write("ID,Name,Category,Quantity,Price\n")
+        for i in range(5):
+            csv_file.write(f"{i},Bolt {i},Fixings,{i},0.25\n")
+        csv_file.close()
+        
+        # Another instance imports while the client is checking
+        def import_elsewhere():
+            DatabaseManager(self.temp_db.name).import_from_csv(csv_file.name)
+        
+        try:
+            with self.run_before_change_query(import_elsewhere):
+                latest_seq, changes = self.db_manager.get_changes_since(start_seq)
+        finally:
+            os.unlink(csv_file.name)
+        
+        self.assertEqual(len(self.db_manager.get_all_items()), 5)
+        self.assertEqual(latest_seq, self.db_manager.get_latest_change_seq())
+        self.assertIsNone(changes)
+    
+    def test_failed_bulk_import_keeps_change_feed(self):
+        start_seq = self.db_manager.get_latest_change_seq()
+        
+        csv_file = NamedTemporaryFile("w", delete=False, suffix=".csv", newline="")
+        csv_file.write("ID,Name,Category,Quantity,Price\n1,Bolt,Fixings,4,0.25\n2,Nut,Fixings,many,0.1\n")
+        csv_file.close()
+        try:
+            self.assertFalse(self.db_manager.import_from_csv(csv_file.name))
+        finally:
+            os.unlink(csv_file.name)
+        
+        self.assertEqual(self.db_manager.get_all_items(), [])
+        self.assertEqual(self.db_manager.get_latest_change_seq(), start_seq)
+        
+        # The insert trigger was restored by the rollback
+        item_id = self.db_manager.add_item("Drill", "Tools", 1, 49.0)
+        latest_seq, changes = self.db_manager.get_changes_since(start_seq)
+        self.assertEqual([change[0] for change in changes], [item_id])
+    
+    def test_writes_enforce_change_log_retention(self):
+        self.db_manager.change_log_retention = 3
+        
+        item_id = self.db_manager.add_item("Laptop", "Electronics", 5, 899.99)
+        for quantity in range(10):
+            self.assertTrue(self.db_manager.update_item(item_id, "Laptop", "Electronics", quantity, 899.99))
+        self.assertTrue(self.db_manager.delete_item(item_id))
+        
+        # The log stays at the limit while the instance is open
+        conn = sqlite3.connect(self.temp_db.name)
+        operations = [row[0] for row in conn.execute("SELECT operation FROM inventory_changes ORDER BY seq")]
+        conn.close()
+        self.assertEqual(operations, ["update", "update", "delete"])
+    
+    def test_changes_since_sees_prune_from_other_instance(self):
+        self.db_manager.add_item("Laptop", "Electronics", 5, 899.99)
+        start_seq = self.db_manager.get_latest_change_seq()
+        
+        # Another instance writes and prunes while the client is checking
+        def prune_elsewhere():
+            other = DatabaseManager(self.temp_db.name)
+            for i in range(5):
+                other.add_item(f"Item {i}", "Test Category", i, 1.0)
+            other.prune_changes(keep=2)
+        
+        with self.run_before_change_query(prune_elsewhere):
+            latest_seq, changes = self.db_manager.get_changes_since(start_seq)
+        
+        self.assertEqual(latest_seq, self.db_manager.get_latest_change_seq())
+        self.assertIsNone(changes)
+    
+    def test_data_version_detects_other_connections(self):
+        version = self.db_manager.get_data_version()
+        self.assertEqual(self.db_manager.get_data_version(), version)
+        
+        # A second manager on the same file acts as another app instance
+        other = DatabaseManager(self.temp_db.name)
+        other.add_item("Helmet", "Safety", 6, 45.0)
+        self.assertNotEqual(self.db_manager.get_data_version(), version)
+    
+    def test_data_version_reconnects_after_error(self):
+        self.db_manager.get_data_version()
+        
+        # A closed connection fails once, then a new one is opened
+        self.db_manager.watch_conn.close()
+        self.assertIsNone(self.db_manager.get_data_version())
+        self.assertIsNone(self.db_manager.watch_conn)
+        self.assertIsNotNone(self.db_manager.get_data_version())
+    
+    def test_snapshot_round_trip(self):
+        self.db_manager.add_item("Laptop", "Electronics", 5, 899.99)
+        self.db_manager.add_item("Café Mug", None, 12, 3.5)
+        self.db_manager.add_item("Pencil", "Office Supplies", 100, 0.99)
+        
+        snapshot_file = NamedTemporaryFile(delete=False, suffix=".baeinv")
+        snapshot_file.close()
+        other_db = NamedTemporaryFile(delete=False)
+        other_db.close()
+        try:
+            self.assertTrue(self.db_manager.export_to_snapshot(snapshot_file.name))
+            
+            # Import into a fresh database, as another site would
+            other = DatabaseManager(other_db.name)
+            self.assertTrue(other.import_from_snapshot(snapshot_file.name))
+            
+            items = [item[1:] for item in other.get_all_items()]
+            self.assertEqual(items, [
+                ("Café Mug", None, 12, 3.5),
+                ("Laptop", "Electronics", 5, 899.99),
+                ("Pencil", "Office Supplies", 100, 0.99),
+            ])
+        finally:
+            os.unlink(snapshot_file.name)
+            os.unlink(other_db.name)
+    
+    def test_snapshot_blocks(self):
+        rows = [(i, f"Item {i}", f"Category {i % 3}" if i % 4 else None, i * 2, i / 4) for i in range(10)]
+        # An empty category stays distinct from a NULL one
+        rows[5] = (5, "Item 5", "", 10, 1.25)
+        
+        snapshot_file = NamedTemporaryFile(delete=False)
+        snapshot_file.close()
+        try:
+            # Small blocks so the file holds several of them
+            self.assertEqual(write_snapshot(snapshot_file.name, rows, block_rows=4), 10)
+            
+            with SnapshotReader(snapshot_file.name) as reader:
+                self.assertEqual(reader.row_count, 10)
+                blocks = list(reader)
+                self.assertEqual([len(block) for block in blocks], [4, 4, 2])
+                self.assertEqual(blocks[1].ids(), [4, 5, 6, 7])
+                self.assertEqual([row for block in blocks for row in block.rows()], rows)
+        finally:
+            os.unlink(snapshot_file.name)
+    
+    def test_snapshot_narrow_columns(self):
+        # Small values are packed narrowly, wide ones still round-trip
+        narrow = [(1000 + i, f"Item {i}", "Tools", i, 1.0) for i in range(3)]
+        wide = [(5, "Crate", "Tools", -3, 2.0), (2 ** 40, "Pallet", "Tools", 2 ** 33, 3.0)]
+        
+        snapshot_file = NamedTemporaryFile(delete=False)
+        snapshot_file.close()
+        try:
+            write_snapshot(snapshot_file.name, narrow + wide, block_rows=3)
+            
+            with SnapshotReader(snapshot_file.name) as reader:
+                blocks = list(reader)
+                self.assertEqual(blocks[0].id_base, 1000)
+                self.assertEqual(blocks[0].id_offsets.itemsize, 1)
+                self.assertEqual(blocks[0].quantities.itemsize, 1)
+                self.assertEqual(blocks[1].quantities.itemsize, 8)
+                self.assertEqual([row for block in blocks for row in block.rows()], narrow + wide)
+            
+            with self.assertRaises(ValueError):
+                write_snapshot(snapshot_file.name, narrow, block_rows=70000)
+        finally:
+            os.unlink(snapshot_file.name)
+    
+    def test_import_snapshot_rejects_other_files(self):
+        not_snapshot = NamedTemporaryFile(delete=False, suffix=".csv")
+        not_snapshot.write(b"ID,Name,Category,Quantity,Price\n")
+        not_snapshot.close()
+        try:
+            self.assertFalse(self.db_manager.import_from_snapshot(not_snapshot.name))
+            self.assertEqual(self.db_manager.get_all_items(), [])
+        finally:
+            os.unlink(not_snapshot.name)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file